@@ -1,24 +1,50 @@
 from __future__ import annotations
 
+import asyncio
 import os
+import sys
+import threading
 from typing import List, Optional, Dict, Any
+
+import numpy as np
 from fastapi import FastAPI, Request, Form, File, UploadFile, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+from jinja2 import FileSystemBytecodeCache
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+
+# Load .env once, before the utils modules read their settings from the environment.
+load_dotenv()
 
-from utils.text_extraction import extract_text_from_uploaded_file, AllowedExtensionError
+from utils.text_extraction import (
+    spool_upload,
+    extract_text_offloaded,
+    shutdown_pdf_pool,
+    AllowedExtensionError,
+)
+from utils.prefilter import route_for_llm, MODEL_TIERS, ACCEPT_MIN_SCORE
 from utils.ai_client import (
     generate_jd_summary,
-    match_resume_to_jd,
+    llm_enabled,
+    match_resumes_to_jd,
+    review_resumes_with_llm,
     generate_interview_email,
     generate_rejection_email,
+    stream_interview_email,
+    stream_rejection_email,
+    warm_token_encoding,
 )
 
 APP_TITLE = "Recruitment AI Agent"
 APP_DESC = "AI-powered resume matching and recruitment assistant (rewritten, safe fallbacks)"
 MAX_FILE_SIZE_MB = 10
+MAX_FILES_PER_UPLOAD = 20
+# Whole multipart body limit, checked from Content-Length before the body is read.
+MAX_UPLOAD_BYTES = MAX_FILES_PER_UPLOAD * MAX_FILE_SIZE_MB * 1024 * 1024
 ALLOWED_UPLOADS = {".pdf", ".docx", ".txt"}
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", ".jinja_cache")
 
 app = FastAPI(title=APP_TITLE, description=APP_DESC)
 
@@ -26,6 +52,60 @@ app = FastAPI(title=APP_TITLE, description=APP_DESC)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 templates = Jinja2Templates(directory="templates")
+# Templates only change on deploy: parse each one once at startup and skip the
+# per-render lookup and mtime check. Compiled bytecode is kept across restarts.
+templates.env.auto_reload = False
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+templates.env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+INDEX_TEMPLATE = templates.get_template("index.html")
+RESULTS_TEMPLATE = templates.get_template("results.html")
+
+
+def _render(template, context: Dict[str, Any]) -> HTMLResponse:
+    return HTMLResponse(template.render(context))
+
+
+@app.on_event("startup")
+def _startup() -> None:
+    # tiktoken may download its encoding on first use with no timeout; do it in a
+    # daemon thread so neither startup nor the event loop waits on the network.
+    threading.Thread(target=warm_token_encoding, daemon=True).start()
+
+
+@app.on_event("shutdown")
+def _shutdown() -> None:
+    shutdown_pdf_pool()
+
+
+class RejectOversizedUploads:
+    """
+    Refuse oversized uploads from the headers, before the multipart body is parsed.
+    Plain ASGI, so every other request (static files, streamed emails) passes straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/resumes/upload":
+            try:
+                content_length = int(dict(scope["headers"]).get(b"content-length", b"0"))
+            except ValueError:
+                content_length = 0
+            if content_length > MAX_UPLOAD_BYTES:
+                response = JSONResponse(
+                    status_code=413,
+                    content={
+                        "detail": f"Upload too large. Limit is {MAX_FILES_PER_UPLOAD} files of "
+                        f"{MAX_FILE_SIZE_MB}MB each."
+                    },
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(RejectOversizedUploads)
 
 
 def _init_state() -> None:
@@ -39,8 +119,8 @@ def _init_state() -> None:
 async def home(request: Request):
     """Serve the index page."""
     _init_state()
-    return templates.TemplateResponse(
-        "index.html",
+    return _render(
+        INDEX_TEMPLATE,
         {
             "request": request,
             "jd": app.state.jd,
@@ -57,13 +137,13 @@ async def jd_summary(request: Request, jd_text: str = Form(...)):
     if not jd_text or not jd_text.strip():
         raise HTTPException(status_code=400, detail="Job description text is required.")
     try:
-        summary = generate_jd_summary(jd_text.strip())
+        summary = await generate_jd_summary(jd_text.strip())
         app.state.jd = {"text": jd_text.strip(), "summary": summary}
         app.state.results = []
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to summarize JD: {e}")
-    return templates.TemplateResponse(
-        "results.html",
+    return _render(
+        RESULTS_TEMPLATE,
         {"request": request, "jd": app.state.jd, "results": app.state.results, "email": None},
     )
 
@@ -76,8 +156,9 @@ async def upload_resumes(request: Request, files: List[UploadFile] = File(...)):
         raise HTTPException(status_code=400, detail="Please provide a JD first.")
     if not files:
         raise HTTPException(status_code=400, detail="No files uploaded.")
+    if len(files) > MAX_FILES_PER_UPLOAD:
+        raise HTTPException(status_code=400, detail=f"Upload at most {MAX_FILES_PER_UPLOAD} files at a time.")
 
-    results: List[Dict[str, Any]] = []
     for file in files:
         ext = os.path.splitext(file.filename)[1].lower()
         if ext not in ALLOWED_UPLOADS:
@@ -85,31 +166,84 @@ async def upload_resumes(request: Request, files: List[UploadFile] = File(...)):
         if file.size and file.size > MAX_FILE_SIZE_MB * 1024 * 1024:
             raise HTTPException(status_code=413, detail=f"{file.filename} is too large.")
 
-        try:
-            text = await extract_text_from_uploaded_file(file)
-        except AllowedExtensionError as e:
-            raise HTTPException(status_code=415, detail=str(e))
-        except Exception as e:
-            raise HTTPException(status_code=422, detail=f"Failed to read {file.filename}: {e}")
-
-        try:
-            score, details = match_resume_to_jd(text, app.state.jd["text"])
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to score {file.filename}: {e}")
-
-        results.append(
-            {
-                "filename": file.filename,
-                "score": round(float(score) * 100, 2),
-                "details": details,
-            }
+    jd_text = app.state.jd["text"]
+    # Bound the extraction fan-out so a large batch doesn't flood the threadpool.
+    slots = asyncio.Semaphore(os.cpu_count() or 4)
+
+    async def extract_one(file: UploadFile) -> str:
+        async with slots:
+            try:
+                spool = await spool_upload(file)
+                try:
+                    return await extract_text_offloaded(spool, file.filename)
+                finally:
+                    spool.close()
+            except AllowedExtensionError as e:
+                raise HTTPException(status_code=415, detail=str(e))
+            except Exception as e:
+                raise HTTPException(status_code=422, detail=f"Failed to read {file.filename}: {e}")
+
+    texts = await asyncio.gather(*(extract_one(f) for f in files))
+
+    try:
+        scored = await run_in_threadpool(match_resumes_to_jd, list(texts), jd_text)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to score resumes: {e}")
+
+    # Resumes that clear the local pre-filter are reviewed by a cheap or strong model
+    # depending on their local score; the rest, and any the model doesn't answer,
+    # keep the local score. Without an API key nothing is routed (or marked as failed).
+    tiers = route_for_llm([score for score, _ in scored]) if llm_enabled() else {}
+    reviews: Dict[str, Dict[str, Any]] = {}
+    for tier_reviews in await asyncio.gather(
+        *(
+            review_resumes_with_llm(jd_text, [(str(i + 1), texts[i]) for i in idx], model=MODEL_TIERS[tier])
+            for tier, idx in tiers.items()
+            if idx
+        )
+    ):
+        reviews.update(tier_reviews)
+    # LLM fit scores and local cosine scores are on different scales, so rank in
+    # groups: accepted on the local score, then LLM-reviewed, then local-only.
+    sent = {i for idx in tiers.values() for i in idx}
+    percents: List[float] = []
+    groups: List[int] = []
+    for i, (score, details) in enumerate(scored):
+        review = reviews.get(str(i + 1))
+        if review is None:
+            percents.append(round(float(score) * 100, 2))
+            if score >= ACCEPT_MIN_SCORE:
+                groups.append(0)
+                details["basis"] = "local match (accepted)"
+            else:
+                groups.append(2)
+                details["basis"] = "local match (LLM review failed)" if i in sent else "local match"
+            continue
+        details.update(
+            method="llm_review",
+            basis="LLM review",
+            local_score=round(float(score) * 100, 2),
+            missing_skills=review["missing_skills"],
+            remarks=review["remarks"],
         )
+        percents.append(round(review["score"], 2))
+        groups.append(1)
 
-    results.sort(key=lambda r: r["score"], reverse=True)
+    # Rank by flat arrays instead of sorting dicts with a key function.
+    scores = np.array(percents, dtype=np.float64)
+    order = np.lexsort((-scores, np.array(groups)))
+    results: List[Dict[str, Any]] = [
+        {
+            "filename": files[i].filename,
+            "score": float(scores[i]),
+            "details": scored[i][1],
+        }
+        for i in order
+    ]
     app.state.results = results
 
-    return templates.TemplateResponse(
-        "results.html",
+    return _render(
+        RESULTS_TEMPLATE,
         {"request": request, "jd": app.state.jd, "results": app.state.results, "email": None},
     )
 
@@ -129,11 +263,44 @@ async def email_generate(
         raise HTTPException(status_code=400, detail="candidate_name is required.")
 
     if email_type == "interview":
-        email = generate_interview_email(candidate_name.strip(), app.state.jd.get("text", ""))
+        email = await generate_interview_email(candidate_name.strip(), app.state.jd.get("text", ""))
     else:
-        email = generate_rejection_email(candidate_name.strip())
+        email = await generate_rejection_email(candidate_name.strip())
 
-    return templates.TemplateResponse(
-        "results.html",
+    return _render(
+        RESULTS_TEMPLATE,
         {"request": request, "jd": app.state.jd, "results": app.state.results, "email": email, "candidate_email": candidate_email},
     )
+
+
+@app.post("/email/stream")
+async def email_stream(
+    email_type: str = Form(...),
+    candidate_name: str = Form(...),
+):
+    """Stream an interview or rejection email as plain text while it is generated."""
+    _init_state()
+    if email_type not in {"interview", "rejection"}:
+        raise HTTPException(status_code=400, detail="Invalid email_type.")
+    if not candidate_name.strip():
+        raise HTTPException(status_code=400, detail="candidate_name is required.")
+
+    if email_type == "interview":
+        chunks = stream_interview_email(candidate_name.strip(), app.state.jd.get("text", ""))
+    else:
+        chunks = stream_rejection_email(candidate_name.strip())
+    return StreamingResponse(chunks, media_type="text/plain")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # JD and results live in app.state, so keep one worker unless that state moves out of process.
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "127.0.0.1"),
+        port=int(os.getenv("PORT", "8000")),
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+    )
@@ -1,66 +1,425 @@
 from __future__ import annotations
-import os, re, math
-from typing import Tuple, Dict, Any
+import os, re, json, time, asyncio
+from functools import lru_cache
+from typing import Tuple, Dict, Any, List, Optional, Set, AsyncIterator
 from collections import Counter
 
+import numpy as np
+from pydantic import BaseModel, Field, ValidationError
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, CountVectorizer, HashingVectorizer
+from starlette.concurrency import run_in_threadpool
+
+from utils.llm_cache import LLMCache
+
 # Try to import new OpenAI client (v1.x)
 try:
-    from openai import OpenAI
+    import httpx
+    from openai import AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
+
+    # Errors still failing after the SDK's own retries; these count toward the circuit breaker.
+    _TRANSIENT_ERRORS: Tuple[type, ...] = (APIConnectionError, InternalServerError, RateLimitError)
+except ImportError:
+    httpx = None
+    AsyncOpenAI = None
+    _TRANSIENT_ERRORS = ()
+
+# Optional faster JSON parsing of model replies
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional exact token counting for prompt budgets
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# HTTP/2 needs the optional h2 package (pip install "httpx[http2]")
+try:
+    import h2  # noqa: F401
+    _HTTP2 = True
 except ImportError:
-    OpenAI = None
+    _HTTP2 = False
 
 # Config
 _OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 _OPENAI_KEY = os.getenv("OPENAI_API_KEY")
+_OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+_OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+_OPENAI_EMBED_MODEL = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
+_SEMANTIC_CACHE_THRESHOLD = float(os.getenv("LLM_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+_LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "10"))
+_REVIEW_BATCH_SIZE = int(os.getenv("LLM_REVIEW_BATCH_SIZE", "5"))
+_JD_PROMPT_MAX_TOKENS = int(os.getenv("JD_PROMPT_MAX_TOKENS", "2000"))
+_RESUME_PROMPT_MAX_TOKENS = int(os.getenv("RESUME_PROMPT_MAX_TOKENS", "1500"))
+_LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".llm_cache")
+_LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+_LOG_LLM_USAGE = os.getenv("LLM_LOG_USAGE", "0") == "1"
+_BREAKER_FAIL_MAX = int(os.getenv("LLM_BREAKER_FAIL_MAX", "5"))
+_BREAKER_RESET_TIMEOUT = float(os.getenv("LLM_BREAKER_RESET_TIMEOUT", "30"))
+
+# Caps in-flight chat completions across all requests to stay under rate limits.
+_llm_slots = asyncio.Semaphore(_LLM_MAX_CONCURRENCY)
+
+
+class LLMUnavailable(RuntimeError):
+    """Raised instead of calling OpenAI while the circuit breaker is open."""
+
+
+class _CircuitBreaker:
+    """
+    Opens after fail_max consecutive transient failures; while open, calls fail fast
+    with LLMUnavailable for reset_timeout seconds. After that a single call probes the
+    API (others keep failing fast) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, fail_max: int, reset_timeout: float):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    def check(self) -> None:
+        if self._opened_at is None:
+            return
+        if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+            raise LLMUnavailable("OpenAI circuit open after repeated failures")
+        self._probing = True  # half-open: this caller is the probe
+
+    def record(self, error: Optional[BaseException] = None) -> None:
+        """Record a call's outcome; pass the exception it raised, or None on success."""
+        if isinstance(error, _TRANSIENT_ERRORS):
+            self._failures += 1
+            if self._probing or self._failures >= self.fail_max:
+                self._opened_at = time.monotonic()
+        elif error is None or isinstance(error, Exception):
+            # The API answered (even if with a 4xx), so it is reachable.
+            self._failures = 0
+            self._opened_at = None
+        # Cancelled calls say nothing about the API; just free the probe slot.
+        self._probing = False
+
+
+_breaker = _CircuitBreaker(_BREAKER_FAIL_MAX, _BREAKER_RESET_TIMEOUT)
+
+_llm_cache = LLMCache(
+    similarity_threshold=_SEMANTIC_CACHE_THRESHOLD,
+    directory=_LLM_CACHE_DIR,
+    ttl=_LLM_CACHE_TTL,
+)
 
 
 # ----------------------------
 # Utility functions
 # ----------------------------
+@lru_cache(maxsize=1)
 def _openai_client():
-    """Return OpenAI client if API key is available, else None."""
-    if _OPENAI_KEY and OpenAI:
-        return OpenAI(api_key=_OPENAI_KEY)
+    """
+    Return the shared async OpenAI client if API key is available, else None.
+    Built once so its keep-alive connection pool is reused across calls.
+    """
+    if _OPENAI_KEY and AsyncOpenAI:
+        http_client = httpx.AsyncClient(
+            http2=_HTTP2,
+            # Sized for concurrent review chunks + streamed emails; HTTP/2 multiplexes them.
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        )
+        # The SDK retries 429/5xx/connection errors itself with asyncio-based backoff.
+        return AsyncOpenAI(
+            api_key=_OPENAI_KEY,
+            http_client=http_client,
+            max_retries=_OPENAI_MAX_RETRIES,
+            timeout=httpx.Timeout(_OPENAI_TIMEOUT, connect=5.0),
+        )
     return None
 
 
+def llm_enabled() -> bool:
+    """True when an OpenAI client is configured (API key set and the SDK installed)."""
+    return _openai_client() is not None
+
+
+async def _embed_batch(client, texts: List[str]) -> Optional[np.ndarray]:
+    """
+    Embed all texts with a single embeddings request.
+    Returns an (n, dim) array of unit-normalized rows, or None if the call fails.
+    """
+    try:
+        resp = await client.embeddings.create(model=_OPENAI_EMBED_MODEL, input=texts)
+    except asyncio.CancelledError as e:
+        _breaker.record(e)
+        raise
+    except Exception as e:
+        _breaker.record(e)
+        print(f"[WARN] OpenAI embedding failed. Error: {e}")
+        return None
+    _breaker.record()
+    data = sorted(resp.data, key=lambda d: d.index)
+    vecs = np.asarray([d.embedding for d in data], dtype=np.float32)
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vecs / norms
+
+
+async def _embed(client, text: str) -> Optional[np.ndarray]:
+    """Return a unit-normalized embedding of text, or None if the call fails."""
+    vecs = await _embed_batch(client, [text])
+    if vecs is None or not vecs[0].any():
+        return None
+    return vecs[0]
+
+
+async def _chat(
+    client,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    semantic: bool = False,
+    model: Optional[str] = None,
+    **params: Any,
+) -> str:
+    """
+    Run a chat completion through the response cache.
+    With semantic=True a near-duplicate prompt (embedding cosine >= threshold) is
+    also served from cache; only use it where the prompt carries no per-person details.
+    Extra params (response_format, max_tokens, ...) are passed to the API and keyed in the cache.
+    """
+    model = model or _OPENAI_MODEL
+    key = LLMCache.make_key(model, temperature, [messages, params] if params else messages)
+    cached = await _llm_cache.aget(key)
+    if cached is not None:
+        return cached
+
+    embedding = None
+    if semantic:
+        _breaker.check()  # don't spend an embeddings round trip while OpenAI is down
+        embedding = await _embed(client, messages[-1]["content"])
+        if embedding is not None:
+            cached = _llm_cache.get_similar(embedding)
+            if cached is not None:
+                await _llm_cache.aput(key, cached)
+                return cached
+
+    _breaker.check()
+    async with _llm_slots:
+        try:
+            resp = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                **params,
+            )
+        except BaseException as e:
+            _breaker.record(e)
+            raise
+    _breaker.record()
+    if _LOG_LLM_USAGE and resp.usage is not None:
+        # prompt_tokens_details is newer than this SDK, so it may arrive as a plain dict.
+        details = getattr(resp.usage, "prompt_tokens_details", None) or {}
+        if not isinstance(details, dict):
+            details = vars(details)
+        cached_tokens = details.get("cached_tokens") or 0
+        print(f"[INFO] {model}: {resp.usage.prompt_tokens} prompt tokens ({cached_tokens} cached)")
+    content = (resp.choices[0].message.content or "").strip()
+    if content:
+        await _llm_cache.aput(key, content, embedding)
+    return content
+
+
+async def _chat_stream(
+    client, messages: List[Dict[str, str]], temperature: float, **params: Any
+) -> AsyncIterator[str]:
+    """
+    Stream a chat completion as text deltas, sharing _chat's exact cache.
+    A cache hit is yielded in one piece; a completed, non-empty stream is stored for next time.
+    """
+    key = LLMCache.make_key(_OPENAI_MODEL, temperature, [messages, params] if params else messages)
+    cached = await _llm_cache.aget(key)
+    if cached is not None:
+        yield cached
+        return
+
+    pieces: List[str] = []
+    _breaker.check()
+    async with _llm_slots:
+        try:
+            stream = await client.chat.completions.create(
+                model=_OPENAI_MODEL,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+                **params,
+            )
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    pieces.append(delta)
+                    yield delta
+        except BaseException as e:
+            _breaker.record(e)
+            raise
+    _breaker.record()
+    content = "".join(pieces).strip()
+    if content:
+        await _llm_cache.aput(key, content)
+
+
+_TOKEN_PATTERN = r"[A-Za-z0-9_+#.-]+"
+_TOKEN_RE = re.compile(_TOKEN_PATTERN)
+_SENT_RE = re.compile(r"(?<=[.!?])\s+")
+# Resume lines are often bullets without end punctuation, so split on newlines too.
+_RESUME_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|\s*\n\s*")
+
+# Sections worth keeping for the summary prompt (it asks for these topics).
+_JD_KEY_HEADINGS = (
+    r"requirements|responsibilities|qualifications|skills|experience|"
+    r"nice[ -]to[ -]have|preferred|location|remote|the role|about the role|what you"
+)
+_JD_KEY_SECTION_RE = re.compile(rf"[ \t]*({_JD_KEY_HEADINGS})", re.IGNORECASE)
+# A section starts at a short capitalized line ending in ":", at a line that is just one
+# of the key headings above (colon optional), or at an inline "Location: ..." line.
+# Other colon-less short lines ("Python and Django", "Acme Payments") are content.
+_SECTION_SPLIT_RE = re.compile(
+    r"\n(?=[ \t]*(?:[A-Z][A-Za-z /&'-]{2,40}:[ \t]*\n"
+    rf"|(?i:{_JD_KEY_HEADINGS})[A-Za-z /&'-]{{0,30}}:?[ \t]*\n"
+    r"|(?:Work )?Location[ \t]*:))"
+)
+
+# Stateless: rows come out as L2-normalized term counts, so cosine is a plain dot product.
+_HASHER = HashingVectorizer(
+    token_pattern=_TOKEN_PATTERN, n_features=2**18, alternate_sign=False, norm="l2"
+)
+
+
 def _tokenize(text: str) -> list[str]:
-    return re.findall(r"[A-Za-z0-9_+#.-]+", (text or "").lower())
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+@lru_cache(maxsize=1)
+def _token_encoding():
+    """
+    tiktoken encoding for the chat model, or None (no tiktoken / encoding not downloadable).
+    The first call may download the BPE file with no timeout, so token counting only
+    runs in worker threads; see warm_token_encoding.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(_OPENAI_MODEL)
+    except Exception:
+        try:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"[WARN] tiktoken encoding unavailable, estimating tokens from length. Error: {e}")
+            return None
+
+
+def warm_token_encoding() -> None:
+    """Load (and if needed download) the tiktoken encoding ahead of the first request."""
+    _token_encoding()
+
+
+def _count_tokens(text: str) -> int:
+    """Token count (exact with tiktoken, else ~4 chars per token)."""
+    enc = _token_encoding()
+    return len(text) // 4 + 1 if enc is None else len(enc.encode(text))
+
+
+def _truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens (exact with tiktoken, else ~4 chars per token)."""
+    enc = _token_encoding()
+    if enc is None:
+        return text[: max_tokens * 4]
+    ids = enc.encode(text)
+    return text if len(ids) <= max_tokens else enc.decode(ids[:max_tokens])
+
+
+def _jd_snippet(jd_text: str) -> str:
+    """
+    Keep the JD intro plus the sections the summary asks about, within the token budget.
+    If no key heading is found at all the whole JD is used (still capped) instead.
+    """
+    jd_text = (jd_text or "").strip()
+    sections = _SECTION_SPLIT_RE.split(jd_text)
+    picked = sections[:1] + [sec for sec in sections[1:] if _JD_KEY_SECTION_RE.match(sec.lstrip("\n"))]
+    snippet = "\n".join(picked).strip() if len(picked) > 1 else jd_text
+    return _truncate_tokens(snippet, _JD_PROMPT_MAX_TOKENS)
+
+
+def _key_terms(text: str) -> Set[str]:
+    """Non-stopword tokens with sentence punctuation trimmed ("docker." -> "docker")."""
+    return {t.strip(".-") for t in _tokenize(text)} - ENGLISH_STOP_WORDS - {""}
+
+
+def _resume_excerpt(text: str, jd_terms: Set[str], max_tokens: int = _RESUME_PROMPT_MAX_TOKENS) -> str:
+    """
+    Fit a resume into max_tokens for the review prompt. Over budget, keep the sentences
+    sharing the most terms with the JD (in their original order) under a header listing
+    the JD terms the resume mentions, so skills from dropped sentences still show up.
+    A sentence too long for the remaining budget is cut to fit rather than dropped.
+    """
+    text = (text or "").strip()
+    if _count_tokens(text) <= max_tokens:
+        return text
+
+    sentences = [s for s in _RESUME_SPLIT_RE.split(text) if s]
+    matched = sorted(jd_terms & _key_terms(text))[:40]
+    header = f"[Excerpt] JD terms found: {', '.join(matched)}\n" if matched else "[Excerpt]\n"
+    budget = max_tokens - _count_tokens(header)
+
+    hits = [len(jd_terms & _key_terms(sent)) for sent in sentences]
+    keep: Dict[int, str] = {}
+    for i in sorted(range(len(sentences)), key=lambda i: -hits[i]):
+        if budget <= 1:
+            break
+        cost = _count_tokens(sentences[i]) + 1
+        if cost <= budget:
+            keep[i] = sentences[i]
+            budget -= cost
+        elif budget > 32:  # worth a partial sentence
+            keep[i] = _truncate_tokens(sentences[i], budget - 1)
+            budget = 0
+    return header + "\n".join(keep[i] for i in sorted(keep))
+
+
+def _resume_excerpts(texts: List[str], jd_text: str) -> List[str]:
+    """_resume_excerpt for a batch; token counting may block, so run it in a thread."""
+    jd_terms = _key_terms(jd_text)
+    return [_resume_excerpt(text, jd_terms) for text in texts]
 
 
 def _cosine_on_counts(a: Counter, b: Counter) -> float:
     """Compute cosine similarity between two Counters of tokens."""
-    keys = set(a.keys()) | set(b.keys())
-    dot = sum(a[k] * b[k] for k in keys)
-    na = math.sqrt(sum(v * v for v in a.values())) or 1e-9
-    nb = math.sqrt(sum(v * v for v in b.values())) or 1e-9
-    return float(dot / (na * nb))
+    # Only shared keys contribute to the dot product; each norm needs just its own counts.
+    shared = list(a.keys() & b.keys())
+    va = np.fromiter((a[k] for k in shared), dtype=np.float64, count=len(shared))
+    vb = np.fromiter((b[k] for k in shared), dtype=np.float64, count=len(shared))
+    na = float(np.linalg.norm(np.fromiter(a.values(), dtype=np.float64, count=len(a)))) or 1e-9
+    nb = float(np.linalg.norm(np.fromiter(b.values(), dtype=np.float64, count=len(b)))) or 1e-9
+    return float(va @ vb / (na * nb))
 
 
 # ----------------------------
 # JD Summary
 # ----------------------------
-def generate_jd_summary(jd_text: str) -> str:
+async def generate_jd_summary(jd_text: str) -> str:
     """Generate a concise JD summary using OpenAI if available, else fallback."""
     client = _openai_client()
     if client:
         try:
+            snippet = await run_in_threadpool(_jd_snippet, jd_text)
             prompt = (
                 "Summarize this job description in 4–6 bullet points covering: "
                 "role, must-have skills, nice-to-haves, experience level, location/remote, and responsibilities.\n\n"
-                f"JD:\n{jd_text}"
-            )
-            resp = client.chat.completions.create(
-                model=_OPENAI_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
+                f"JD:\n{snippet}"
             )
-            return resp.choices[0].message.content.strip()
+            return await _chat(client, [{"role": "user", "content": prompt}], temperature=0.2, semantic=True)
         except Exception as e:
             print(f"[WARN] OpenAI summary failed, using fallback. Error: {e}")
 
     # ---- Fallback: first 5 sentences ----
-    parts = re.split(r"(?<=[.!?])\s+", (jd_text or "").strip())
+    parts = _SENT_RE.split((jd_text or "").strip())
     parts = [p.strip() for p in parts if p.strip()]
     return " ".join(parts[:5]) or jd_text.strip()
 
@@ -89,30 +448,172 @@ def match_resume_to_jd(resume_text: str, jd_text: str) -> Tuple[float, Dict[str,
     return score, details
 
 
+def match_resumes_to_jd(resume_texts: List[str], jd_text: str) -> List[Tuple[float, Dict[str, Any]]]:
+    """
+    Score a batch of resumes against one JD.
+    Same metric as match_resume_to_jd, but computed with array ops: cosine comes from
+    hashed, unit-normalized count vectors (no vocabulary to build), and overlaps from a
+    CountVectorizer whose vocabulary is just the JD's terms.
+    """
+    if not resume_texts:
+        return []
+    docs = [t or "" for t in resume_texts]
+
+    unit = _HASHER.transform([jd_text or ""] + docs)
+    scores = (unit[1:] @ unit[0].T).toarray().ravel()
+
+    # Only JD terms can overlap, so the vocabulary never has to grow past the JD.
+    cv = CountVectorizer(token_pattern=_TOKEN_PATTERN, lowercase=True)
+    try:
+        jd_vals = cv.fit_transform([jd_text or ""]).toarray().ravel()
+    except ValueError:  # JD has no tokens
+        return [(0.0, {"method": "cosine_similarity_local", "top_overlap_terms": []}) for _ in docs]
+    overlap = np.minimum(cv.transform(docs).toarray(), jd_vals)
+    jd_terms = cv.get_feature_names_out()
+
+    results: List[Tuple[float, Dict[str, Any]]] = []
+    for score, row in zip(scores, overlap):
+        nz = np.flatnonzero(row)
+        top = nz[np.argsort(-row[nz], kind="stable")[:30]]
+        details = {
+            "method": "cosine_similarity_local",
+            "top_overlap_terms": jd_terms[top].tolist(),
+        }
+        results.append((float(score), details))
+    return results
+
+
+# JSON mode replies are bare objects; this only strips a stray ``` / ```json fence.
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+
+
+def _parse_json_object(content: str) -> Dict[str, Any]:
+    """Parse a JSON object from a model reply, tolerating a ```json fence around it."""
+    content = _FENCE_RE.sub("", content)
+    data = orjson.loads(content) if orjson is not None else json.loads(content)
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    return data
+
+
+class ResumeReview(BaseModel):
+    """One resume's verdict as returned by the model."""
+
+    score: float = Field(ge=0, le=100)
+    missing_skills: List[str] = []
+    remarks: str = ""
+
+
+def _clean_review(raw: Any) -> Optional[Dict[str, Any]]:
+    if not isinstance(raw, dict):
+        return None
+    try:
+        return dict(ResumeReview(**raw))
+    except ValidationError:
+        return None
+
+
+async def _review_chunk(
+    client, jd_text: str, resumes: List[Tuple[str, str]], model: str
+) -> Dict[str, Dict[str, Any]]:
+    # Instructions + JD form a byte-identical prefix for every chunk of a batch, so
+    # OpenAI's prompt caching can reuse it; only the resumes differ per request.
+    system = (
+        "Review each resume the user sends against the job description.\n"
+        "Reply with only a JSON object mapping every resume id to "
+        '{"score": <0-100 fit>, "missing_skills": [<required skills absent from the resume>], '
+        '"remarks": "<one sentence>"}.\n\n'
+        f"JD:\n{jd_text}"
+    )
+    user = "".join(f"--- Resume {resume_id} ---\n{text}\n\n" for resume_id, text in resumes)
+    content = await _chat(
+        client,
+        [{"role": "system", "content": system}, {"role": "user", "content": user.strip()}],
+        temperature=0.0,
+        model=model,
+        response_format={"type": "json_object"},
+    )
+    data = _parse_json_object(content)
+
+    reviews: Dict[str, Dict[str, Any]] = {}
+    for resume_id, _ in resumes:
+        review = _clean_review(data.get(resume_id))
+        if review is not None:
+            reviews[resume_id] = review
+    return reviews
+
+
+async def review_resumes_with_llm(
+    jd_text: str, resumes: List[Tuple[str, str]], model: Optional[str] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Ask the model (OPENAI_MODEL unless given) to review (resume_id, resume_text) pairs against the JD.
+    Resumes are sent LLM_REVIEW_BATCH_SIZE per request and the requests run concurrently.
+    Returns {resume_id: {"score": 0-100, "missing_skills": [...], "remarks": str}} for the
+    resumes the model answered; a failed request only drops its own resumes.
+    """
+    client = _openai_client()
+    if not client or not resumes:
+        return {}
+    model = model or _OPENAI_MODEL
+
+    # Per-resume cache: re-scoring the same resume against the same JD skips the LLM,
+    # whichever batch it arrives in.
+    reviews: Dict[str, Dict[str, Any]] = {}
+    keys: Dict[str, str] = {}
+    pending: List[Tuple[str, str]] = []
+    for resume_id, text in resumes:
+        keys[resume_id] = LLMCache.make_key(model, 0.0, ["resume_review", jd_text, text])
+        cached = await _llm_cache.aget(keys[resume_id])
+        if cached is not None:
+            reviews[resume_id] = json.loads(cached)
+        else:
+            pending.append((resume_id, text))
+
+    excerpts = await run_in_threadpool(_resume_excerpts, [text for _, text in pending], jd_text)
+    pending = [(resume_id, excerpt) for (resume_id, _), excerpt in zip(pending, excerpts)]
+
+    size = max(_REVIEW_BATCH_SIZE, 1)
+    chunks = [pending[i:i + size] for i in range(0, len(pending), size)]
+    outcomes = await asyncio.gather(
+        *(_review_chunk(client, jd_text, chunk, model) for chunk in chunks), return_exceptions=True
+    )
+
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            print(f"[WARN] OpenAI resume review failed, keeping local scores. Error: {outcome}")
+            continue
+        for resume_id, review in outcome.items():
+            await _llm_cache.aput(keys[resume_id], json.dumps(review))
+            reviews[resume_id] = review
+    return reviews
+
+
 # ----------------------------
 # Email Generation
 # ----------------------------
-def generate_interview_email(candidate_name: str, jd_text: str) -> str:
-    """Generate an interview invite email."""
-    client = _openai_client()
-    if client:
-        try:
-            prompt = (
-                f"Write a concise, friendly interview invite email to {candidate_name}. "
-                "Propose a 30–45 min call, ask for availability + timezone. "
-                "Infer the role title if possible from the JD.\n\n"
-                f"JD:\n{jd_text}"
-            )
-            resp = client.chat.completions.create(
-                model=_OPENAI_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-            )
-            return resp.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"[WARN] OpenAI interview email failed, using fallback. Error: {e}")
+# Output tokens dominate email latency, so cap the length and discourage filler.
+_EMAIL_TEMPERATURE = 0.2
+_EMAIL_PARAMS: Dict[str, Any] = {
+    "max_tokens": 180,
+    "stop": ["\n\n---"],
+    "presence_penalty": 0,
+    "frequency_penalty": 0.5,
+}
 
-    # ---- Fallback ----
+
+def _interview_prompt(candidate_name: str, jd_text: str) -> str:
+    return (
+        f"Interview invite email to {candidate_name}.\n"
+        "- Subject line, then body; <=120 words\n"
+        "- Role title from the JD if clear\n"
+        "- Propose a 30–45 min call; ask for availability + timezone\n"
+        "- No pleasantries or filler\n\n"
+        f"JD:\n{_jd_snippet(jd_text)}"
+    )
+
+
+def _interview_fallback(candidate_name: str) -> str:
     return (
         f"Subject: Interview Invitation\n\n"
         f"Hi {candidate_name},\n\n"
@@ -122,25 +623,16 @@ def generate_interview_email(candidate_name: str, jd_text: str) -> str:
     )
 
 
-def generate_rejection_email(candidate_name: str) -> str:
-    """Generate a polite rejection email."""
-    client = _openai_client()
-    if client:
-        try:
-            prompt = (
-                f"Write a brief and empathetic rejection email to {candidate_name}. "
-                "Thank them for applying and encourage future applications. Keep it under 150 words."
-            )
-            resp = client.chat.completions.create(
-                model=_OPENAI_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
-            )
-            return resp.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"[WARN] OpenAI rejection email failed, using fallback. Error: {e}")
+def _rejection_prompt(candidate_name: str) -> str:
+    return (
+        f"Rejection email to {candidate_name}.\n"
+        "- Subject line, then body; <=120 words\n"
+        "- Empathetic; thank them; encourage future applications\n"
+        "- No pleasantries or filler"
+    )
 
-    # ---- Fallback ----
+
+def _rejection_fallback(candidate_name: str) -> str:
     return (
         f"Subject: Application Update\n\n"
         f"Hi {candidate_name},\n\n"
@@ -148,3 +640,68 @@ def generate_rejection_email(candidate_name: str) -> str:
         "We encourage you to apply for future opportunities.\n\n"
         "Best regards,\nRecruitment Team"
     )
+
+
+async def _stream_email(prompt: str, fallback: str, label: str) -> AsyncIterator[str]:
+    client = _openai_client()
+    if client:
+        started = False
+        try:
+            messages = [{"role": "user", "content": prompt}]
+            async for delta in _chat_stream(client, messages, _EMAIL_TEMPERATURE, **_EMAIL_PARAMS):
+                started = started or bool(delta.strip())
+                yield delta
+            if started:
+                return
+            print(f"[WARN] OpenAI {label} email came back empty, using fallback.")
+        except Exception as e:
+            print(f"[WARN] OpenAI {label} email failed, using fallback. Error: {e}")
+            if started:  # part of the draft is already out; don't append a second email
+                return
+
+    # ---- Fallback ----
+    yield fallback
+
+
+async def stream_interview_email(candidate_name: str, jd_text: str) -> AsyncIterator[str]:
+    """Stream an interview invite email as it is generated."""
+    prompt = await run_in_threadpool(_interview_prompt, candidate_name, jd_text)
+    async for delta in _stream_email(prompt, _interview_fallback(candidate_name), "interview"):
+        yield delta
+
+
+def stream_rejection_email(candidate_name: str) -> AsyncIterator[str]:
+    """Stream a polite rejection email as it is generated."""
+    return _stream_email(_rejection_prompt(candidate_name), _rejection_fallback(candidate_name), "rejection")
+
+
+async def generate_interview_email(candidate_name: str, jd_text: str) -> str:
+    """Generate an interview invite email."""
+    client = _openai_client()
+    if client:
+        try:
+            prompt = await run_in_threadpool(_interview_prompt, candidate_name, jd_text)
+            email = await _chat(client, [{"role": "user", "content": prompt}], _EMAIL_TEMPERATURE, **_EMAIL_PARAMS)
+            if email:
+                return email
+        except Exception as e:
+            print(f"[WARN] OpenAI interview email failed, using fallback. Error: {e}")
+
+    # ---- Fallback ----
+    return _interview_fallback(candidate_name)
+
+
+async def generate_rejection_email(candidate_name: str) -> str:
+    """Generate a polite rejection email."""
+    client = _openai_client()
+    if client:
+        try:
+            prompt = _rejection_prompt(candidate_name)
+            email = await _chat(client, [{"role": "user", "content": prompt}], _EMAIL_TEMPERATURE, **_EMAIL_PARAMS)
+            if email:
+                return email
+        except Exception as e:
+            print(f"[WARN] OpenAI rejection email failed, using fallback. Error: {e}")
+
+    # ---- Fallback ----
+    return _rejection_fallback(candidate_name)
@@ -0,0 +1,133 @@
+from __future__ import annotations
+import hashlib, json, threading
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+# Optional on-disk store for the exact tier
+try:
+    from diskcache import Cache as DiskCache
+except ImportError:
+    DiskCache = None
+
+
+class LLMCache:
+    """
+    Two-tier cache for chat completions.
+    - Exact tier: BLAKE2b of (model, temperature, messages) -> response. Kept in an
+      in-process LRU and, when diskcache is installed and a directory is given, also
+      on disk with an optional TTL so it survives restarts. get/put only touch memory;
+      the async aget/aput also go to disk, in the threadpool (SQLite I/O can block).
+    - Semantic tier: unit-normalized prompt embeddings (in-process only); a lookup
+      returns the stored response whose embedding has cosine >= similarity_threshold.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.92,
+        max_entries: int = 512,
+        directory: Optional[str] = None,
+        ttl: Optional[int] = None,
+        size_limit: int = 2**30,
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.directory = directory
+        self.ttl = ttl
+        self.size_limit = size_limit
+        self._lock = threading.Lock()
+        self._exact: "OrderedDict[str, str]" = OrderedDict()
+        self._semantic_keys: List[str] = []
+        self._semantic_vectors = np.empty((0, 0), dtype=np.float32)
+        self._disk = None
+
+    @staticmethod
+    def make_key(model: str, temperature: float, messages: List[Any]) -> str:
+        payload = json.dumps([model, temperature, messages], sort_keys=True, ensure_ascii=False)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=32).hexdigest()
+
+    def _disk_cache(self):
+        """Open the disk store on first use so importing the module creates no files."""
+        with self._lock:
+            if self._disk is None and self.directory and DiskCache is not None:
+                try:
+                    self._disk = DiskCache(self.directory, size_limit=self.size_limit)
+                except Exception as e:
+                    print(f"[WARN] LLM disk cache unavailable, using memory only. Error: {e}")
+                    self.directory = None
+            return self._disk
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        disk = self._disk_cache()
+        return disk.get(key) if disk is not None else None
+
+    def _disk_set(self, key: str, response: str) -> None:
+        disk = self._disk_cache()
+        if disk is not None:
+            disk.set(key, response, expire=self.ttl)
+
+    def _remember(self, key: str, response: str) -> None:
+        self._exact[key] = response
+        self._exact.move_to_end(key)
+        while len(self._exact) > self.max_entries:
+            old_key, _ = self._exact.popitem(last=False)
+            self._drop_semantic(old_key)
+
+    def _lookup(self, key: str) -> Optional[str]:
+        value = self._exact.get(key)
+        if value is not None:
+            self._exact.move_to_end(key)
+        return value
+
+    def get(self, key: str) -> Optional[str]:
+        """Memory-only lookup."""
+        with self._lock:
+            return self._lookup(key)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Memory, then disk (off the event loop); disk hits are promoted to memory."""
+        value = self.get(key)
+        if value is None and self.directory and DiskCache is not None:
+            value = await run_in_threadpool(self._disk_get, key)
+            if value is not None:
+                with self._lock:
+                    self._remember(key, value)
+        return value
+
+    def get_similar(self, embedding: np.ndarray) -> Optional[str]:
+        """Return the response of the closest stored prompt if it clears the threshold."""
+        with self._lock:
+            if not self._semantic_keys or self._semantic_vectors.shape[1] != embedding.shape[0]:
+                return None
+            sims = self._semantic_vectors @ embedding
+            best = int(np.argmax(sims))
+            if sims[best] < self.similarity_threshold:
+                return None
+            return self._lookup(self._semantic_keys[best])
+
+    def put(self, key: str, response: str, embedding: Optional[np.ndarray] = None) -> None:
+        """Memory-only store."""
+        with self._lock:
+            if embedding is not None and key not in self._semantic_keys:
+                row = embedding.astype(np.float32).reshape(1, -1)
+                if self._semantic_keys and self._semantic_vectors.shape[1] == row.shape[1]:
+                    self._semantic_vectors = np.vstack([self._semantic_vectors, row])
+                else:
+                    self._semantic_keys = []
+                    self._semantic_vectors = row
+                self._semantic_keys.append(key)
+            self._remember(key, response)
+
+    async def aput(self, key: str, response: str, embedding: Optional[np.ndarray] = None) -> None:
+        """Store in memory now and on disk in the threadpool."""
+        self.put(key, response, embedding)
+        if self.directory and DiskCache is not None:
+            await run_in_threadpool(self._disk_set, key, response)
+
+    def _drop_semantic(self, key: str) -> None:
+        if key in self._semantic_keys:
+            idx = self._semantic_keys.index(key)
+            del self._semantic_keys[idx]
+            self._semantic_vectors = np.delete(self._semantic_vectors, idx, axis=0)
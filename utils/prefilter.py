@@ -0,0 +1,52 @@
+from __future__ import annotations
+import os
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+# Local cosine (0-1) a resume needs before it is worth an LLM review; tune per JD style.
+PREFILTER_MIN_SCORE = float(os.getenv("LLM_PREFILTER_MIN_SCORE", "0.2"))
+# Review at most this many of the best local matches per upload (0 = no cap).
+PREFILTER_TOP_K = int(os.getenv("LLM_PREFILTER_TOP_K", "0"))
+
+
+def select_for_llm(
+    scores: Sequence[float],
+    min_score: float = PREFILTER_MIN_SCORE,
+    top_k: int = PREFILTER_TOP_K,
+) -> List[int]:
+    """
+    Return indices of resumes that should get an LLM review, in their original order.
+    A resume qualifies if its local score is >= min_score; with top_k > 0 only the
+    top_k best qualifying resumes are kept.
+    """
+    arr = np.asarray(scores, dtype=np.float64)
+    idx = np.flatnonzero(arr >= min_score)
+    if top_k > 0 and idx.size > top_k:
+        idx = idx[np.argsort(-arr[idx], kind="stable")[:top_k]]
+    return sorted(idx.tolist())
+
+
+# Model used for each review tier (see route_for_llm).
+MODEL_TIERS = {
+    "cheap": os.getenv("LLM_CHEAP_MODEL", "gpt-4o-mini"),
+    "strong": os.getenv("LLM_STRONG_MODEL", "gpt-4o"),
+}
+# Local score from which a resume is reviewed by the strong model instead of the cheap one.
+STRONG_MIN_SCORE = float(os.getenv("LLM_STRONG_MIN_SCORE", "0.5"))
+# Local score from which a resume is accepted on the local score alone (no LLM call).
+ACCEPT_MIN_SCORE = float(os.getenv("LLM_ACCEPT_MIN_SCORE", "0.9"))
+
+
+def route_for_llm(scores: Sequence[float]) -> Dict[str, List[int]]:
+    """
+    Split pre-filtered resumes into review tiers by local score:
+    [PREFILTER_MIN_SCORE, STRONG_MIN_SCORE) -> "cheap", [STRONG_MIN_SCORE, ACCEPT_MIN_SCORE) -> "strong".
+    Resumes below the pre-filter or at/above ACCEPT_MIN_SCORE get no LLM review.
+    """
+    tiers: Dict[str, List[int]] = {"cheap": [], "strong": []}
+    for i in select_for_llm(scores):
+        if scores[i] >= ACCEPT_MIN_SCORE:
+            continue
+        tiers["strong" if scores[i] >= STRONG_MIN_SCORE else "cheap"].append(i)
+    return tiers
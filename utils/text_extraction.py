@@ -1,8 +1,18 @@
 from __future__ import annotations
-import os, tempfile
+import asyncio, codecs, io, multiprocessing, os, tempfile, zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Optional
 from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+# Try PDF extractors (pypdfium2 is native and much faster; the others are pure Python)
+try:
+    import pypdfium2 as pdfium
+except Exception:
+    pdfium = None
 
-# Try PDF extractors
 try:
     from pdfminer.high_level import extract_text as pdf_extract_text
 except Exception:
@@ -14,6 +24,7 @@ except Exception:
     PyPDF2 = None
 
 from docx import Document  # pip install python-docx
+from lxml import etree  # installed with python-docx
 
 
 class AllowedExtensionError(Exception):
@@ -22,60 +33,290 @@ class AllowedExtensionError(Exception):
 
 ALLOWED_EXTS = {".pdf", ".docx", ".txt"}
 
+# Uploads are copied in fixed-size chunks; spools stay in RAM up to SPOOL_MAX_SIZE, then roll to disk.
+CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 1024 * 1024
 
-async def extract_text_from_uploaded_file(file: UploadFile) -> str:
-    """
-    Extract text from uploaded file (PDF/DOCX/TXT).
-    Uses pdfminer.six or PyPDF2 for PDF.
-    """
-    name = file.filename or "uploaded"
-    ext = os.path.splitext(name)[1].lower()
+# pypdfium2 releases the GIL, so it runs in the threadpool on the spooled upload. Only PDFs
+# it gets no text from go to worker processes, so the pure-Python fallbacks don't contend
+# for the GIL. Set PDF_PROCESS_WORKERS=0 to run the fallbacks in the threadpool instead.
+PDF_PROCESS_WORKERS = int(os.getenv("PDF_PROCESS_WORKERS", str(os.cpu_count() or 1)))
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+
+# OCR for scanned PDFs (no text layer). Off by default; needs pytesseract, Pillow and the
+# tesseract binary. Pages are rendered with pypdfium2, so poppler is not required.
+ENABLE_OCR = os.getenv("ENABLE_OCR", "0") == "1"
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_CONFIG = "--oem 1 --psm 6"
+# Resumes are short; don't OCR (or hold page images for) more pages than this.
+OCR_MAX_PAGES = int(os.getenv("OCR_MAX_PAGES", "10"))
+# Tesseract processes per PDF. Each PDF worker process runs its own, so split the CPUs
+# between them instead of giving every worker cpu_count.
+OCR_THREADS = int(
+    os.getenv("OCR_THREADS", str(max(1, (os.cpu_count() or 1) // max(PDF_PROCESS_WORKERS, 1))))
+)
 
+
+def _check_extension(name: str) -> str:
+    ext = os.path.splitext(name)[1].lower()
     if ext not in ALLOWED_EXTS:
         raise AllowedExtensionError(
             f"Unsupported extension: {ext}. Allowed: {', '.join(sorted(ALLOWED_EXTS))}"
         )
+    return ext
 
-    suffix = ext if ext in {".pdf", ".docx"} else ".txt"
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        content = await file.read()
-        tmp.write(content)
-        tmp_path = tmp.name
 
+async def spool_upload(file: UploadFile) -> tempfile.SpooledTemporaryFile:
+    """
+    Copy an upload into a SpooledTemporaryFile chunk by chunk.
+    Peak memory is bounded by CHUNK_SIZE + SPOOL_MAX_SIZE instead of the file size.
+    The caller owns (and must close) the returned spool.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
     try:
-        text = ""
-        if ext == ".pdf":
-            if pdf_extract_text is not None:
-                try:
-                    text = pdf_extract_text(tmp_path) or ""
-                except Exception as e:
-                    print(f"[WARN] pdfminer failed, falling back to PyPDF2: {e}")
-            if (not text) and PyPDF2 is not None:
-                try:
-                    with open(tmp_path, "rb") as f:
-                        reader = PyPDF2.PdfReader(f)
-                        pages = [p.extract_text() or "" for p in reader.pages]
-                    text = "\n".join(pages)
-                except Exception as e:
-                    print(f"[ERROR] PyPDF2 failed too: {e}")
-            if not text:
-                raise RuntimeError("No PDF extractor available. Install pdfminer.six or PyPDF2.")
-        
-        elif ext == ".docx":
+        while chunk := await file.read(CHUNK_SIZE):
+            spool.write(chunk)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def _raw_file(stream: BinaryIO) -> BinaryIO:
+    """
+    SpooledTemporaryFile only implements readinto()/readable() from Python 3.11; on older
+    versions hand out the spool's underlying BytesIO / temp file, which has them.
+    """
+    return stream if hasattr(stream, "readinto") else getattr(stream, "_file", stream)
+
+
+def _pdfium_extract_text(stream: BinaryIO) -> str:
+    pdf = pdfium.PdfDocument(_raw_file(stream))
+    try:
+        pages = []
+        for page in pdf:
+            textpage = page.get_textpage()
+            pages.append(textpage.get_text_bounded())
+            textpage.close()
+            page.close()
+        return "\n".join(pages)
+    finally:
+        pdf.close()
+
+
+def _ocr_pdf(stream: BinaryIO) -> str:
+    """
+    OCR the first OCR_MAX_PAGES pages of a PDF. PDFium isn't thread-safe, so pages are
+    rendered one at a time here, while tesseract (a subprocess per page) runs in parallel
+    threads. At most OCR_THREADS rendered pages are in flight, bounding image memory.
+    """
+    import pytesseract  # lazy: only needed when OCR is enabled
+
+    # Parallelism comes from running pages side by side; keep each tesseract to one
+    # OpenMP thread so the process count is the whole CPU budget.
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+    if pdfium is None:
+        raise RuntimeError("OCR needs pypdfium2 to render PDF pages.")
+    stream.seek(0)
+    pdf = pdfium.PdfDocument(_raw_file(stream))
+    try:
+        texts = []
+        with ThreadPoolExecutor(max_workers=OCR_THREADS) as pool:
+            pending = deque()
+            for i in range(min(len(pdf), OCR_MAX_PAGES)):
+                if len(pending) >= OCR_THREADS:
+                    texts.append(pending.popleft().result())
+                page = pdf[i]
+                image = page.render(scale=OCR_DPI / 72, grayscale=True).to_pil()
+                page.close()
+                pending.append(pool.submit(pytesseract.image_to_string, image, config=OCR_CONFIG))
+                del image
+            texts.extend(f.result() for f in pending)
+        return "\n".join(texts)
+    finally:
+        pdf.close()
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_DOCX_TAGS = (f"{_W}p", f"{_W}t", f"{_W}tab", f"{_W}br", f"{_W}cr")
+
+
+def _docx_extract_text(stream: BinaryIO) -> str:
+    """
+    Stream word/document.xml and join the w:t runs of each w:p paragraph, skipping
+    python-docx's per-paragraph objects. Unlike doc.paragraphs it also picks up
+    paragraphs inside tables, which resumes often use for layout.
+    """
+    paragraphs, runs = [], []
+    with zipfile.ZipFile(stream) as zf, zf.open("word/document.xml") as xml:
+        # Uploads are untrusted: never expand entities or fetch external resources,
+        # whatever the installed lxml's defaults are.
+        events = etree.iterparse(
+            xml, events=("end",), tag=_DOCX_TAGS, resolve_entities=False, no_network=True, load_dtd=False
+        )
+        for _, el in events:
+            if el.tag == f"{_W}t":
+                runs.append(el.text or "")
+            elif el.tag == f"{_W}tab":
+                runs.append("\t")
+            elif el.tag != f"{_W}p":
+                runs.append("\n")
+            else:
+                paragraphs.append("".join(runs))
+                runs = []
+                el.clear()
+    return "\n".join(paragraphs)
+
+
+def _pdfium_text_or_empty(stream: BinaryIO) -> str:
+    if pdfium is None:
+        return ""
+    try:
+        return _pdfium_extract_text(stream)
+    except Exception as e:
+        print(f"[WARN] pypdfium2 failed, falling back to pdfminer: {e}")
+        return ""
+
+
+def _pdf_fallback_text(stream: BinaryIO) -> str:
+    """pdfminer, then PyPDF2, then OCR (if enabled) for PDFs pypdfium2 got no text from."""
+    text = ""
+    if pdf_extract_text is not None:
+        try:
+            stream.seek(0)
+            text = pdf_extract_text(stream) or ""
+        except Exception as e:
+            print(f"[WARN] pdfminer failed, falling back to PyPDF2: {e}")
+    if (not text) and PyPDF2 is not None:
+        try:
+            stream.seek(0)
+            reader = PyPDF2.PdfReader(stream)
+            pages = [p.extract_text() or "" for p in reader.pages]
+            text = "\n".join(pages)
+        except Exception as e:
+            print(f"[ERROR] PyPDF2 failed too: {e}")
+    if (not text.strip()) and ENABLE_OCR:
+        try:
+            text = _ocr_pdf(stream)
+        except Exception as e:
+            print(f"[ERROR] OCR failed: {e}")
+    if not text:
+        raise RuntimeError("No PDF extractor available. Install pypdfium2, pdfminer.six or PyPDF2.")
+    return text.strip()
+
+
+def extract_text_from_stream(stream: BinaryIO, filename: str) -> str:
+    """
+    Extract text from a seekable binary stream (PDF/DOCX/TXT).
+    Uses pypdfium2 for PDF, with pdfminer.six and then PyPDF2 as fallbacks.
+    """
+    ext = _check_extension(filename or "uploaded")
+
+    text = ""
+    if ext == ".pdf":
+        text = _pdfium_text_or_empty(stream)
+        if not text.strip():
+            text = _pdf_fallback_text(stream)
+
+    elif ext == ".docx":
+        try:
+            text = _docx_extract_text(stream)
+        except Exception as e:
+            print(f"[WARN] DOCX XML parse failed, falling back to python-docx: {e}")
             try:
-                doc = Document(tmp_path)
+                stream.seek(0)
+                doc = Document(stream)
                 text = "\n".join(p.text for p in doc.paragraphs)
             except Exception as e:
                 raise RuntimeError(f"Failed to read DOCX: {e}")
-        
-        else:  # .txt
-            with open(tmp_path, "r", encoding="utf-8", errors="ignore") as f:
-                text = f.read()
 
+    else:  # .txt: decode chunk by chunk instead of holding the raw bytes and the str at once
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        parts = []
+        while chunk := stream.read(CHUNK_SIZE):
+            parts.append(decoder.decode(chunk))
+        parts.append(decoder.decode(b"", final=True))
+        text = "".join(parts)
+
+    return text.strip()
+
+
+def _pdf_fallback_bytes(data: bytes) -> str:
+    """Worker-process entry point: run the pure-Python PDF fallbacks on a PDF passed as bytes."""
+    return _pdf_fallback_text(io.BytesIO(data))
+
+
+def _get_pdf_pool() -> Optional[ProcessPoolExecutor]:
+    global _pdf_pool
+    if _pdf_pool is None and PDF_PROCESS_WORKERS > 0:
+        # Don't fork: the server process has live threads (anyio workers, httpx, cache
+        # locks) whose held locks would be copied into the children.
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            ctx = multiprocessing.get_context("forkserver")
+            # Warm the fork server with the extractor libraries rather than the app's __main__.
+            ctx.set_forkserver_preload([__name__])
+        else:
+            ctx = multiprocessing.get_context("spawn")
+        _pdf_pool = ProcessPoolExecutor(max_workers=PDF_PROCESS_WORKERS, mp_context=ctx)
+    return _pdf_pool
+
+
+def shutdown_pdf_pool() -> None:
+    """Stop the PDF worker processes (call on app shutdown)."""
+    global _pdf_pool
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=False, cancel_futures=True)
+        _pdf_pool = None
+
+
+def _discard_pdf_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken pool; a replacement that other requests already use is left alone."""
+    global _pdf_pool
+    if _pdf_pool is pool:
+        _pdf_pool = None
+    pool.shutdown(wait=False)
+
+
+async def extract_text_offloaded(stream: BinaryIO, filename: str) -> str:
+    """
+    Run extract_text_from_stream off the event loop.
+    pypdfium2, DOCX and TXT run in the threadpool on the stream itself; only PDFs that
+    pypdfium2 gets no text from are copied to the worker-process pool for the fallbacks
+    (or parsed in a thread if the pool is disabled or broken).
+    """
+    ext = _check_extension(filename or "uploaded")
+    if ext != ".pdf":
+        return await run_in_threadpool(extract_text_from_stream, stream, filename)
+
+    text = await run_in_threadpool(_pdfium_text_or_empty, stream)
+    if text.strip():
         return text.strip()
+    pool = _get_pdf_pool()
+    if pool is None:
+        return await run_in_threadpool(_pdf_fallback_text, stream)
+
+    stream.seek(0)
+    data = await run_in_threadpool(stream.read)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, _pdf_fallback_bytes, data)
+    except BrokenProcessPool as e:
+        print(f"[WARN] PDF worker pool broke, parsing in a thread instead: {e}")
+        _discard_pdf_pool(pool)
+        return await run_in_threadpool(_pdf_fallback_bytes, data)
 
+
+async def extract_text_from_uploaded_file(file: UploadFile) -> str:
+    """
+    Extract text from uploaded file (PDF/DOCX/TXT).
+    The upload is spooled in chunks rather than read into memory in one go.
+    """
+    name = file.filename or "uploaded"
+    _check_extension(name)
+
+    spool = await spool_upload(file)
+    try:
+        return await extract_text_offloaded(spool, name)
     finally:
-        try:
-            os.unlink(tmp_path)  # cleanup temp file
-        except Exception:
-            pass
+        spool.close()